@@ -5,12 +5,14 @@ Upload your Rekordbox XML collection export and get insights about your music co
 """
 
 import streamlit as st
+import numpy as np
+import orjson
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import xml.etree.ElementTree as ET
-from typing import Dict, List, Any, Tuple
-from io import StringIO
+from lxml import etree as ET
+from typing import Dict, Iterator, List, Any, Tuple
+from io import BytesIO
 
 # ============================================================================
 # Configuration & Setup
@@ -23,6 +25,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Number of tracks sent to the browser per page of the detailed track table
+TABLE_PAGE_SIZE = 500
+
 st.title("🎵 Rekordbox Collection Analyzer")
 st.markdown("Upload your Rekordbox XML collection export to explore your music collection with interactive visualizations.")
 
@@ -30,7 +35,7 @@ st.markdown("Upload your Rekordbox XML collection export to explore your music c
 # Parsing Functions
 # ============================================================================
 
-def parse_tempo_marks(track_elem: ET.Element) -> List[Dict[str, Any]]:
+def parse_tempo_marks(track_elem: ET._Element) -> List[Dict[str, Any]]:
     """Extract tempo marks from a track element."""
     tempos = []
     for tempo in track_elem.findall('TEMPO'):
@@ -42,7 +47,7 @@ def parse_tempo_marks(track_elem: ET.Element) -> List[Dict[str, Any]]:
         })
     return tempos
 
-def parse_position_marks(track_elem: ET.Element) -> List[Dict[str, Any]]:
+def parse_position_marks(track_elem: ET._Element) -> List[Dict[str, Any]]:
     """Extract position marks (cue points) from a track element."""
     marks = []
     for mark in track_elem.findall('POSITION_MARK'):
@@ -62,45 +67,293 @@ def parse_position_marks(track_elem: ET.Element) -> List[Dict[str, Any]]:
         marks.append(mark_data)
     return marks
 
-def parse_track(track_elem: ET.Element) -> Dict[str, Any]:
-    """Convert a track XML element to a dictionary."""
-    track = {
-        'track_id': track_elem.get('TrackID'),
-        'name': track_elem.get('Name', ''),
-        'artist': track_elem.get('Artist', ''),
-        'composer': track_elem.get('Composer', ''),
-        'album': track_elem.get('Album', ''),
-        'genre': track_elem.get('Genre', ''),
-        'kind': track_elem.get('Kind', ''),
-        'size': int(track_elem.get('Size', 0)),
-        'total_time': int(track_elem.get('TotalTime', 0)),
-        'year': int(track_elem.get('Year', 0)),
-        'average_bpm': float(track_elem.get('AverageBpm', 0)),
-        'date_added': track_elem.get('DateAdded', ''),
-        'bit_rate': int(track_elem.get('BitRate', 0)),
-        'sample_rate': int(track_elem.get('SampleRate', 0)),
-        'play_count': int(track_elem.get('PlayCount', 0)),
-        'rating': int(track_elem.get('Rating', 0)),
-        'location': track_elem.get('Location', ''),
-        'tonality': track_elem.get('Tonality', ''),
-        'tempos': parse_tempo_marks(track_elem),
-        'position_marks': parse_position_marks(track_elem),
-    }
-    return track
+def text_categorical(values: List[Any]) -> pd.Categorical:
+    """Build a categorical of strings, keeping string categories even if every value is missing."""
+    categorical = pd.Categorical(values)
+    if categorical.categories.empty:
+        categorical = categorical.set_categories(pd.Index([], dtype=str))
+    return categorical
+
+def iter_collection_tracks(xml_bytes: bytes) -> Iterator[ET._Element]:
+    """Yield the TRACK elements of the collection in document order."""
+    # Stream the document so each TRACK subtree can be freed once parsed.
+    # Large collections can exceed libxml2's default depth/size limits, and
+    # Rekordbox XML has no xml:id attributes worth tracking
+    context = ET.iterparse(
+        BytesIO(xml_bytes),
+        events=('end',),
+        tag=('COLLECTION', 'TRACK'),
+        huge_tree=True,
+        collect_ids=False,
+    )
+    for _, elem in context:
+        if elem.tag == 'COLLECTION':
+            # Playlists come after the collection and are not needed
+            return
+
+        # Playlist nodes also contain (attribute-only) TRACK elements
+        if elem.getparent().tag == 'COLLECTION':
+            yield elem
+
+        # Release the parsed track and any already processed siblings
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
 
-def parse_rekordbox_xml(xml_content: str) -> pd.DataFrame:
+    raise ValueError("No COLLECTION element found in XML")
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def parse_rekordbox_xml(xml_bytes: bytes) -> pd.DataFrame:
     """Parse Rekordbox XML collection and return a DataFrame."""
-    root = ET.fromstring(xml_content)
-    collection = root.find('COLLECTION')
+    # Collect each track attribute into its own column list so the DataFrame
+    # can be built directly from columns instead of pivoting per-track dicts.
+    # The lists are not preallocated from COLLECTION's Entries count: appends
+    # are a negligible share of parse time, and writing into preallocated
+    # numpy arrays was measured to be slower due to per-item conversion
+    track_ids, names, artists, composers, albums, genres, kinds = [], [], [], [], [], [], []
+    sizes, total_times, years, average_bpms = [], [], [], []
+    dates_added, bit_rates, sample_rates, play_counts, ratings = [], [], [], [], []
+    locations, tonalities = [], []
+
+    for elem in iter_collection_tracks(xml_bytes):
+        get = elem.get
+        track_ids.append(get('TrackID'))
+        names.append(get('Name', ''))
+        artists.append(get('Artist') or None)
+        composers.append(get('Composer', ''))
+        albums.append(get('Album', ''))
+        genres.append(get('Genre') or None)
+        kinds.append(get('Kind', ''))
+        sizes.append(int(get('Size', 0)))
+        total_times.append(int(get('TotalTime', 0)))
+        years.append(int(get('Year', 0)))
+        average_bpms.append(float(get('AverageBpm', 0)))
+        dates_added.append(get('DateAdded', ''))
+        bit_rates.append(int(get('BitRate', 0)))
+        sample_rates.append(int(get('SampleRate', 0)))
+        play_counts.append(int(get('PlayCount', 0)))
+        ratings.append(int(get('Rating', 0)))
+        locations.append(get('Location', ''))
+        tonalities.append(get('Tonality') or None)
+
+    # Numeric columns are narrowed to 32 bits where Rekordbox's values fit
+    # (file sizes can exceed 2 GiB). Year and rating are not narrowed further
+    # since users can edit them to arbitrary values. Frequently repeated
+    # strings are stored as categoricals so grouping and counting work on codes.
+    # Missing artist, genre and key values are stored as NA rather than '', so
+    # counting skips them without a separate filter
+    df = pd.DataFrame({
+        'track_id': track_ids,
+        'name': names,
+        'artist': text_categorical(artists),
+        'composer': text_categorical(composers),
+        'album': text_categorical(albums),
+        'genre': text_categorical(genres),
+        'kind': text_categorical(kinds),
+        'size': np.asarray(sizes, dtype=np.int64),
+        'total_time': np.asarray(total_times, dtype=np.int32),
+        'year': np.asarray(years, dtype=np.int32),
+        'average_bpm': np.asarray(average_bpms, dtype=np.float32),
+        'date_added': dates_added,
+        'bit_rate': np.asarray(bit_rates, dtype=np.int32),
+        'sample_rate': np.asarray(sample_rates, dtype=np.int32),
+        'play_count': np.asarray(play_counts, dtype=np.int32),
+        'rating': np.asarray(ratings, dtype=np.int32),
+        'location': locations,
+        'tonality': text_categorical(tonalities),
+    })
+
+    return df
+
+# Cached as a shared resource keyed by upload, so the nested marks are neither
+# hashed nor copied on each call. Only the exports use them, so they are parsed
+# once downloads are requested rather than on every upload.
+@st.cache_resource(show_spinner=False, max_entries=2)
+def parse_track_marks(
+    file_id: str, _xml_bytes: bytes
+) -> Tuple[List[List[Dict[str, Any]]], List[List[Dict[str, Any]]]]:
+    """Parse the tempo marks and position marks of each track, in collection order."""
+    tempos, position_marks = [], []
+    for elem in iter_collection_tracks(_xml_bytes):
+        tempos.append(parse_tempo_marks(elem))
+        position_marks.append(parse_position_marks(elem))
+    return tempos, position_marks
+
+# ============================================================================
+# Aggregation Functions
+# ============================================================================
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def precompute_aggregates(df: pd.DataFrame) -> Dict[str, Any]:
+    """Compute every statistic shown in the app in one cached call."""
+    aggregates = {}
+
+    # The top tracks table and bar chart share a single nlargest pass
+    top_25 = df.nlargest(25, 'play_count')
+    top_tracks = top_25[['name', 'artist', 'play_count', 'genre', 'average_bpm']].reset_index(drop=True)
+    top_tracks.index = top_tracks.index + 1
+    aggregates['top_tracks'] = top_tracks
+    # nlargest is already ordered by play count, so reversing it gives the
+    # ascending order the horizontal bar chart needs without another sort
+    aggregates['top_25_sorted'] = top_25[['play_count', 'name']].iloc[::-1]
+
+    # Genres: split comma-separated tags and drop tags without any
+    # alphanumeric character (e.g. stray punctuation)
+    genres = df['genre'].dropna()
+    split_genres = genres.str.split(',').explode().str.strip()
+    split_genres = split_genres[split_genres.str.contains(r'[^\W_]', regex=True)]
+    aggregates['split_genre_counts'] = split_genres.value_counts().sort_values(ascending=True)
+
+    # Normalize genres by sorting them alphabetically to handle "House, Acid" vs "Acid, House"
+    # Also filter out genres that only contain punctuation or whitespace.
+    # Only distinct genre strings are normalized, then their counts are merged
+    raw_genre_counts = genres.value_counts()
+    normalized_genres = raw_genre_counts.index.map(
+        lambda x: ', '.join(sorted([g.strip() for g in x.split(',') if any(c.isalnum() for c in g)]))
+    )
+    genre_counts = raw_genre_counts.groupby(normalized_genres, observed=True).sum()
+    # Only keep genres that have at least one alphanumeric character after normalization
+    genre_counts = genre_counts[genre_counts.index.str.len() > 0]
+    aggregates['genre_counts'] = genre_counts.sort_values(ascending=False, kind='stable')
+
+    # Artists: exclude various artists placeholders (case insensitive). These
+    # are matched against the distinct artist names and dropped from the
+    # per-artist results rather than filtering tracks
+    excluded_artists = {'various artists', 'va', 'v/a'}
+    excluded_labels = [name for name in df['artist'].cat.categories if name.lower() in excluded_artists]
+    artist_plays = df.groupby('artist', observed=True)['play_count'].sum()
+    aggregates['artist_plays'] = artist_plays.drop(excluded_labels).sort_values(ascending=True)
+    aggregates['artist_counts'] = df['artist'].value_counts(ascending=True).drop(excluded_labels)
+
+    aggregates['key_counts'] = df['tonality'].value_counts(ascending=True)
+
+    bpm_values = df.loc[df['average_bpm'] > 0, 'average_bpm'].to_numpy()
+    # Only the binned counts are sent to the browser, not every track's BPM
+    aggregates['bpm_histogram'] = np.histogram(bpm_values, bins=50)
+    # Min, median and max come from a single quantile call on the raw array
+    if bpm_values.size:
+        bpm_min, bpm_median, bpm_max = np.quantile(bpm_values, [0, 0.5, 1.0])
+        bpm_mean = bpm_values.mean(dtype=np.float64)
+    else:
+        bpm_min = bpm_median = bpm_max = bpm_mean = np.nan
+    aggregates['bpm_stats'] = {
+        'median': bpm_median,
+        'mean': bpm_mean,
+        'min': bpm_min,
+        'max': bpm_max,
+    }
+
+    return aggregates
 
-    if collection is None:
-        raise ValueError("No COLLECTION element found in XML")
+# ============================================================================
+# Chart Functions
+# ============================================================================
 
-    tracks = []
-    for track_elem in collection.findall('TRACK'):
-        tracks.append(parse_track(track_elem))
+# Figures are cached as shared resources (not copied per rerun), so callers
+# must not modify the returned figures.
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_top_plays_fig(top_25: pd.DataFrame) -> go.Figure:
+    """Build the horizontal bar chart of the most played tracks."""
+    fig = px.bar(
+        top_25,
+        x='play_count',
+        y='name',
+        orientation='h',
+        title='Top 25 Most Played Tracks',
+        labels={'play_count': 'Play Count', 'name': 'Track Name'},
+        color='play_count',
+        color_continuous_scale='Viridis'
+    )
+    fig.update_layout(height=600, showlegend=False)
+    return fig
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_bpm_fig(counts: np.ndarray, bin_edges: np.ndarray) -> go.Figure:
+    """Build the BPM distribution histogram from precomputed bin counts."""
+    fig = go.Figure(go.Bar(
+        x=(bin_edges[:-1] + bin_edges[1:]) / 2,
+        y=counts,
+        width=np.diff(bin_edges),
+        customdata=np.column_stack([bin_edges[:-1], bin_edges[1:]]),
+        hovertemplate='BPM=%{customdata[0]:.1f}-%{customdata[1]:.1f}<br>count=%{y}<extra></extra>',
+        marker_color='#1f77b4'
+    ))
+    fig.update_layout(
+        title='Distribution of Track BPMs',
+        xaxis_title='BPM',
+        yaxis_title='count',
+        bargap=0,
+        showlegend=False,
+        height=400
+    )
+    return fig
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_genre_pie_fig(genre_counts: pd.Series) -> go.Figure:
+    """Build the pie chart of genre combinations."""
+    return px.pie(
+        values=genre_counts.values,
+        names=genre_counts.index,
+        title='Top 20 Genres (by track count)'
+    )
 
-    return pd.DataFrame(tracks)
+@st.cache_resource(show_spinner=False, max_entries=16)
+def build_counts_bar_fig(
+    counts: pd.Series,
+    title: str,
+    x_label: str,
+    y_label: str,
+    color_scale: str,
+    height: int,
+) -> go.Figure:
+    """Build a horizontal bar chart from a Series of counts indexed by label."""
+    fig = px.bar(
+        x=counts.values,
+        y=counts.index,
+        orientation='h',
+        title=title,
+        labels={'x': x_label, 'y': y_label},
+        color=counts.values,
+        color_continuous_scale=color_scale
+    )
+    fig.update_layout(showlegend=False, height=height)
+    return fig
+
+# ============================================================================
+# Export Functions
+# ============================================================================
+
+# Exports are cached per uploaded file. The file bytes and parsed collection
+# are excluded from the cache key (leading underscore) since they all derive
+# from that file, and hashing them on every rerun would be expensive.
+
+def prepare_export(file_id: str, xml_bytes: bytes, df: pd.DataFrame) -> pd.DataFrame:
+    """Restore the exported layout: empty strings for missing text and nested marks."""
+    tempos, position_marks = parse_track_marks(file_id, xml_bytes)
+    return df.assign(
+        **{column: df[column].cat.add_categories('').fillna('') for column in ('artist', 'genre', 'tonality')},
+        # Both parses walk the same tracks in the same order, so the marks
+        # line up with the DataFrame rows by position
+        tempos=pd.Series(tempos, index=df.index, dtype=object),
+        position_marks=pd.Series(position_marks, index=df.index, dtype=object),
+    )
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def make_csv(file_id: str, _xml_bytes: bytes, _df: pd.DataFrame) -> bytes:
+    """Serialize the collection as CSV."""
+    return prepare_export(file_id, _xml_bytes, _df).to_csv(index=False).encode('utf-8')
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def make_ndjson(file_id: str, _xml_bytes: bytes, _df: pd.DataFrame) -> bytes:
+    """Serialize the collection as newline-delimited JSON, one track per line."""
+    export_df = prepare_export(file_id, _xml_bytes, _df)
+    columns = list(export_df.columns)
+    # orjson serializes numpy scalars natively, and float32 BPMs keep their
+    # short decimal form instead of being widened to float64
+    values = [export_df[column].to_numpy() for column in columns]
+    lines = [orjson.dumps(dict(zip(columns, row)), option=orjson.OPT_SERIALIZE_NUMPY) for row in zip(*values)]
+    return b'\n'.join(lines) + b'\n' if lines else b''
 
 # ============================================================================
 # Sidebar: File Upload
@@ -114,6 +367,21 @@ with st.sidebar:
         help="Export your collection from Rekordbox as XML"
     )
 
+    # Unchecked sections are skipped entirely on rerun, not just hidden
+    show_sections = {}
+    if uploaded_file is not None:
+        st.header("👁️ Sections")
+        for section in (
+            "Most Played Tracks",
+            "BPM Distribution",
+            "Genre Breakdown",
+            "Top Artists",
+            "Key Distribution",
+            "Detailed Track Data",
+            "Download Data",
+        ):
+            show_sections[section] = st.checkbox(section, value=True)
+
 # ============================================================================
 # Main App
 # ============================================================================
@@ -121,11 +389,15 @@ with st.sidebar:
 if uploaded_file is not None:
     # Parse the file
     try:
-        xml_content = uploaded_file.read().decode('utf-8')
-        df = parse_rekordbox_xml(xml_content)
+        # getvalue() returns the full upload regardless of earlier reads,
+        # and bytes make a stable cache key for the parser
+        xml_bytes = uploaded_file.getvalue()
+        df = parse_rekordbox_xml(xml_bytes)
 
         st.success(f"✅ Successfully loaded {len(df):,} tracks!")
 
+        aggregates = precompute_aggregates(df)
+
         # ====================================================================
         # Key Statistics
         # ====================================================================
@@ -147,229 +419,193 @@ if uploaded_file is not None:
 
         with col4:
             # Count unique individual genres (split by comma)
-            all_genres = []
-            for genres_str in df[df['genre'] != '']['genre']:
-                individual_genres = [g.strip() for g in genres_str.split(',')]
-                # Only include genres that have at least one alphanumeric character
-                all_genres.extend([g for g in individual_genres if any(c.isalnum() for c in g)])
-            unique_genres = len(set(all_genres))
+            unique_genres = len(aggregates['split_genre_counts'])
             st.metric("Unique Genres", f"{unique_genres:,}")
 
         # ====================================================================
         # Top Tracks by Play Count
         # ====================================================================
 
-        st.header("🔥 Most Played Tracks")
-
-        top_tracks = df.nlargest(25, 'play_count')[['name', 'artist', 'play_count', 'genre', 'average_bpm']].reset_index(drop=True)
-        top_tracks.index = top_tracks.index + 1
-
-        col_viz, col_table = st.columns([2, 1])
-
-        with col_viz:
-            # Bar chart of top 25 for visibility
-            top_25 = df.nlargest(25, 'play_count').sort_values('play_count')
-            fig_plays = px.bar(
-                top_25,
-                x='play_count',
-                y='name',
-                orientation='h',
-                title='Top 25 Most Played Tracks',
-                labels={'play_count': 'Play Count', 'name': 'Track Name'},
-                color='play_count',
-                color_continuous_scale='Viridis'
-            )
-            fig_plays.update_layout(height=600, showlegend=False)
-            st.plotly_chart(fig_plays, config={})
-
-        with col_table:
-            st.subheader("Top Tracks")
-            st.dataframe(top_tracks, width='stretch', height=400)
+        if show_sections["Most Played Tracks"]:
+            st.header("🔥 Most Played Tracks")
+
+            top_tracks = aggregates['top_tracks']
+
+            col_viz, col_table = st.columns([2, 1])
+
+            with col_viz:
+                # Bar chart of top 25 for visibility
+                fig_plays = build_top_plays_fig(aggregates['top_25_sorted'])
+                st.plotly_chart(fig_plays, config={})
+
+            with col_table:
+                st.subheader("Top Tracks")
+                st.dataframe(top_tracks, width='stretch', height=400)
 
         # ====================================================================
         # BPM Distribution
         # ====================================================================
 
-        st.header("🎼 BPM Distribution")
-
-        col_hist, col_stats = st.columns([2, 1])
-
-        with col_hist:
-            fig_bpm = px.histogram(
-                df[df['average_bpm'] > 0],
-                x='average_bpm',
-                nbins=50,
-                title='Distribution of Track BPMs',
-                labels={'average_bpm': 'BPM'},
-                color_discrete_sequence=['#1f77b4']
-            )
-            fig_bpm.update_layout(showlegend=False, height=400)
-            st.plotly_chart(fig_bpm, config={})
-
-        with col_stats:
-            bpm_data = df[df['average_bpm'] > 0]['average_bpm']
-            st.metric("Median BPM", f"{bpm_data.median():.1f}")
-            st.metric("Mean BPM", f"{bpm_data.mean():.1f}")
-            st.metric("Min BPM", f"{bpm_data.min():.1f}")
-            st.metric("Max BPM", f"{bpm_data.max():.1f}")
+        if show_sections["BPM Distribution"]:
+            st.header("🎼 BPM Distribution")
+
+            col_hist, col_stats = st.columns([2, 1])
+
+            with col_hist:
+                fig_bpm = build_bpm_fig(*aggregates['bpm_histogram'])
+                st.plotly_chart(fig_bpm, config={})
+
+            with col_stats:
+                bpm_stats = aggregates['bpm_stats']
+                st.metric("Median BPM", f"{bpm_stats['median']:.1f}")
+                st.metric("Mean BPM", f"{bpm_stats['mean']:.1f}")
+                st.metric("Min BPM", f"{bpm_stats['min']:.1f}")
+                st.metric("Max BPM", f"{bpm_stats['max']:.1f}")
 
         # ====================================================================
         # Genre Breakdown
         # ====================================================================
 
-        st.header("🎸 Genre Breakdown")
-        st.markdown("<p style='font-size: 15px; color: gray;'>Note: Tracks with missing genre metadata are excluded from these visualizations.</p>", unsafe_allow_html=True)
-
-        col_genre_pie, col_genre_bar = st.columns(2)
-
-        with col_genre_pie:
-            # Normalize genres by sorting them alphabetically to handle "House, Acid" vs "Acid, House"
-            # Also filter out genres that only contain punctuation or whitespace
-            normalized_genres = df[df['genre'] != '']['genre'].apply(
-                lambda x: ', '.join(sorted([g.strip() for g in x.split(',') if any(c.isalnum() for c in g)]))
-            )
-            # Only keep genres that have at least one alphanumeric character after normalization
-            normalized_genres = normalized_genres[normalized_genres.str.len() > 0]
-            genre_counts = normalized_genres.value_counts().head(20)
-            fig_genre_pie = px.pie(
-                values=genre_counts.values,
-                names=genre_counts.index,
-                title='Top 20 Genres (by track count)'
-            )
-            st.plotly_chart(fig_genre_pie, config={})
-
-        with col_genre_bar:
-            # Split genres by comma and count individual genres
-            expanded_genres = []
-            for genres_str in df[df['genre'] != '']['genre']:
-                # Split by comma and strip whitespace
-                individual_genres = [g.strip() for g in genres_str.split(',')]
-                # Only include genres that have at least one alphanumeric character
-                expanded_genres.extend([g for g in individual_genres if any(c.isalnum() for c in g)])
-
-            # Count individual genres
-            from collections import Counter
-            genre_counter = Counter(expanded_genres)
-            genre_split_counts = pd.Series(dict(genre_counter)).sort_values(ascending=True).tail(20)
-
-            fig_genre_split = px.bar(
-                x=genre_split_counts.values,
-                y=genre_split_counts.index,
-                orientation='h',
-                title='Top 20 Genres (by track count, split)',
-                labels={'x': 'Track Count', 'y': 'Genre'},
-                color=genre_split_counts.values,
-                color_continuous_scale='Plasma'
-            )
-            fig_genre_split.update_layout(showlegend=False, height=600)
-            st.plotly_chart(fig_genre_split, config={})
+        if show_sections["Genre Breakdown"]:
+            st.header("🎸 Genre Breakdown")
+            st.markdown("<p style='font-size: 15px; color: gray;'>Note: Tracks with missing genre metadata are excluded from these visualizations.</p>", unsafe_allow_html=True)
+
+            col_genre_pie, col_genre_bar = st.columns(2)
+
+            with col_genre_pie:
+                genre_counts = aggregates['genre_counts'].head(20)
+                fig_genre_pie = build_genre_pie_fig(genre_counts)
+                st.plotly_chart(fig_genre_pie, config={})
+
+            with col_genre_bar:
+                genre_split_counts = aggregates['split_genre_counts'].tail(20)
+
+                fig_genre_split = build_counts_bar_fig(
+                    genre_split_counts,
+                    title='Top 20 Genres (by track count, split)',
+                    x_label='Track Count',
+                    y_label='Genre',
+                    color_scale='Plasma',
+                    height=600,
+                )
+                st.plotly_chart(fig_genre_split, config={})
 
         # ====================================================================
         # Artist Breakdown
         # ====================================================================
 
-        st.header("👨‍🎤 Top Artists")
-        st.markdown("<p style='font-size: 15px; color: gray;'>Note: Tracks attributed to \"Various Artists\" (VA, V/A) or with missing artist metadata are excluded from these visualizations.</p>", unsafe_allow_html=True)
-
-        col_artist_plays, col_artist_count = st.columns(2)
-
-        with col_artist_plays:
-            # Exclude various artists placeholders (case insensitive)
-            excluded_artists = {'various artists', 'va', 'v/a'}
-            df_filtered = df[~df['artist'].str.lower().isin(excluded_artists) & (df['artist'] != '')]
-            artist_plays = df_filtered.groupby('artist')['play_count'].sum().sort_values(ascending=True).tail(20)
-            fig_artist_plays = px.bar(
-                x=artist_plays.values,
-                y=artist_plays.index,
-                orientation='h',
-                title='Top 20 Artists (by play count)',
-                labels={'x': 'Total Play Count', 'y': 'Artist'},
-                color=artist_plays.values,
-                color_continuous_scale='Blues'
-            )
-            fig_artist_plays.update_layout(showlegend=False, height=500)
-            st.plotly_chart(fig_artist_plays, config={})
-
-        with col_artist_count:
-            # Exclude various artists placeholders (case insensitive)
-            excluded_artists = {'various artists', 'va', 'v/a'}
-            df_filtered = df[~df['artist'].str.lower().isin(excluded_artists) & (df['artist'] != '')]
-            artist_counts = df_filtered.groupby('artist').size().sort_values(ascending=True).tail(20)
-            fig_artist_count = px.bar(
-                x=artist_counts.values,
-                y=artist_counts.index,
-                orientation='h',
-                title='Top 20 Artists (by track count)',
-                labels={'x': 'Track Count', 'y': 'Artist'},
-                color=artist_counts.values,
-                color_continuous_scale='Greens'
-            )
-            fig_artist_count.update_layout(showlegend=False, height=500)
-            st.plotly_chart(fig_artist_count, config={})
+        if show_sections["Top Artists"]:
+            st.header("👨‍🎤 Top Artists")
+            st.markdown("<p style='font-size: 15px; color: gray;'>Note: Tracks attributed to \"Various Artists\" (VA, V/A) or with missing artist metadata are excluded from these visualizations.</p>", unsafe_allow_html=True)
+
+            col_artist_plays, col_artist_count = st.columns(2)
+
+            with col_artist_plays:
+                artist_plays = aggregates['artist_plays'].tail(20)
+                fig_artist_plays = build_counts_bar_fig(
+                    artist_plays,
+                    title='Top 20 Artists (by play count)',
+                    x_label='Total Play Count',
+                    y_label='Artist',
+                    color_scale='Blues',
+                    height=500,
+                )
+                st.plotly_chart(fig_artist_plays, config={})
+
+            with col_artist_count:
+                artist_counts = aggregates['artist_counts'].tail(20)
+                fig_artist_count = build_counts_bar_fig(
+                    artist_counts,
+                    title='Top 20 Artists (by track count)',
+                    x_label='Track Count',
+                    y_label='Artist',
+                    color_scale='Greens',
+                    height=500,
+                )
+                st.plotly_chart(fig_artist_count, config={})
 
         # ====================================================================
         # Key Distribution
         # ====================================================================
 
-        st.header("🎹 Key Distribution")
+        if show_sections["Key Distribution"]:
+            st.header("🎹 Key Distribution")
 
-        col_key_counts, col_key_empty = st.columns([2, 1])
+            col_key_counts, col_key_empty = st.columns([2, 1])
 
-        with col_key_counts:
-            key_counts = df[df['tonality'] != ''].groupby('tonality').size().sort_values(ascending=True).tail(30)
-            fig_key = px.bar(
-                x=key_counts.values,
-                y=key_counts.index,
-                orientation='h',
-                title='Top 30 Keys (by track count)',
-                labels={'x': 'Track Count', 'y': 'Key'},
-                color=key_counts.values,
-                color_continuous_scale='Viridis'
-            )
-            fig_key.update_layout(showlegend=False, height=600)
-            st.plotly_chart(fig_key, config={})
+            with col_key_counts:
+                key_counts = aggregates['key_counts'].tail(30)
+                fig_key = build_counts_bar_fig(
+                    key_counts,
+                    title='Top 30 Keys (by track count)',
+                    x_label='Track Count',
+                    y_label='Key',
+                    color_scale='Viridis',
+                    height=600,
+                )
+                st.plotly_chart(fig_key, config={})
 
         # ====================================================================
         # Detailed Data Table
         # ====================================================================
 
-        st.header("📋 Detailed Track Data")
-        st.markdown("<p style='font-size: 15px; color: gray;'>💡 <b>Interactive table</b>: Click on column headers to sort data. Click the three dots (⋮) on a column header to hide/show columns.</p>", unsafe_allow_html=True)
+        if show_sections["Detailed Track Data"]:
+            st.header("📋 Detailed Track Data")
+            st.markdown("<p style='font-size: 15px; color: gray;'>💡 <b>Interactive table</b>: Click on column headers to sort the current page. Click the three dots (⋮) on a column header to hide/show columns.</p>", unsafe_allow_html=True)
+
+            # Large collections are paginated so only one page is sent to the browser
+            n_pages = max(1, -(-len(df) // TABLE_PAGE_SIZE))
+            page = 1
+            if n_pages > 1:
+                page = st.number_input(f"Page (of {n_pages:,})", min_value=1, max_value=n_pages, value=1, step=1)
+            page_start = (page - 1) * TABLE_PAGE_SIZE
 
-        # Create display dataframe with selected columns
-        display_df = df[['name', 'artist', 'genre', 'tonality', 'average_bpm', 'play_count', 'date_added']].copy()
-        display_df.columns = ['Track', 'Artist', 'Genre', 'Key', 'BPM', 'Plays', 'Added']
+            # Only the current page's display columns are copied
+            page_df = df.iloc[page_start:page_start + TABLE_PAGE_SIZE][
+                ['name', 'artist', 'genre', 'tonality', 'average_bpm', 'play_count', 'date_added']
+            ]
+            page_df.columns = ['Track', 'Artist', 'Genre', 'Key', 'BPM', 'Plays', 'Added']
 
-        st.dataframe(display_df, width='stretch', height=600)
+            st.dataframe(page_df, width='stretch', height=600)
+            if n_pages > 1:
+                st.caption(f"Showing tracks {page_start + 1:,}–{page_start + len(page_df):,} of {len(df):,}")
 
         # ====================================================================
         # Data Export
         # ====================================================================
 
-        st.header("📥 Download Data")
-
-        col_csv, col_json = st.columns(2)
-
-        with col_csv:
-            csv_data = df.to_csv(index=False)
-            st.download_button(
-                label="Download as CSV",
-                data=csv_data,
-                file_name="collection_analysis.csv",
-                mime="text/csv"
-            )
-            st.caption("Perfect for Excel, Google Sheets, or spreadsheet analysis")
-
-        with col_json:
-            # Create NDJSON format
-            ndjson_data = df.to_json(orient='records', lines=True)
-            st.download_button(
-                label="Download as NDJSON",
-                data=ndjson_data,
-                file_name="collection_analysis.ndjson",
-                mime="application/x-ndjson"
-            )
-            st.caption("Ideal for advanced/technical data analyses and database imports")
+        if show_sections["Download Data"]:
+            st.header("📥 Download Data")
+
+            # Exports are only built once requested for the current upload,
+            # so loading a collection does not pay for serializing it
+            exports_ready = st.session_state.get('exports_file_id') == uploaded_file.file_id
+            if not exports_ready and st.button("Prepare downloads"):
+                st.session_state['exports_file_id'] = uploaded_file.file_id
+                exports_ready = True
+
+            if exports_ready:
+                col_csv, col_json = st.columns(2)
+
+                with col_csv:
+                    csv_data = make_csv(uploaded_file.file_id, xml_bytes, df)
+                    st.download_button(
+                        label="Download as CSV",
+                        data=csv_data,
+                        file_name="collection_analysis.csv",
+                        mime="text/csv"
+                    )
+                    st.caption("Perfect for Excel, Google Sheets, or spreadsheet analysis")
+
+                with col_json:
+                    ndjson_data = make_ndjson(uploaded_file.file_id, xml_bytes, df)
+                    st.download_button(
+                        label="Download as NDJSON",
+                        data=ndjson_data,
+                        file_name="collection_analysis.ndjson",
+                        mime="application/x-ndjson"
+                    )
+                    st.caption("Ideal for advanced/technical data analyses and database imports")
 
     except Exception as e:
         st.error(f"❌ Error parsing file: {str(e)}")